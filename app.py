@@ -1,30 +1,85 @@
-from datetime import date, datetime, timezone, timedelta
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+from datetime import datetime
 import streamlit as st
 
 # --- LangChain & Generative AI Libraries ---
-from langchain_google_community import CalendarToolkit
-from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_community.callbacks.streamlit import StreamlitCallbackHandler
 from langchain_classic.agents import AgentExecutor, create_tool_calling_agent
-from langchain_classic.memory import ConversationBufferMemory
 from langchain_classic import hub
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain_core.agents import AgentFinish
+from langchain_core.runnables import RunnableLambda
+from langchain_core.messages import AIMessage, HumanMessage, trim_messages
+from langchain_core.messages.utils import count_tokens_approximately
 from langchain.tools import tool
 
+# --- Google API Client ---
+from googleapiclient.errors import HttpError
+
 # --- Third-Party UI Components ---
 from streamlit_calendar import calendar
 
 # --- Custom Application Modules ---
 from function import (
     init_state, 
-    change_on_api_key, 
-    reset_state, 
-    reset_chat_display, 
+    reset_session, 
     get_schedules, 
-    get_id_of_schedules, 
-    get_all_schedules
+    get_llm,
+    get_calendar_tools,
+    get_today_agenda,
+    on_tool_executed,
+    CALENDAR_TZINFO
 )
 
+# ==========================================
+# ERROR CLASSIFICATION TABLE
+# ==========================================
+# Ordered (keywords, message) pairs shared by the engine-initialization and chat-runtime error handlers.
+# The first entry with a keyword found in the lower-cased exception text wins.
+_ERROR_MAP = (
+    # 1. API Quota Limits (Common with Gemini Free Tier)
+    (("429", "quota", "resource exhausted", "resource_exhausted"),
+     "🚨 **API Quota Exceeded**\n\nThe AI Engine is temporarily busy. Google Gemini's limits have been reached. Please wait a minute and try again."),
+
+    # 2. Invalid API Key (Authentication failed)
+    (("api_key", "403", "permission denied", "400"),
+     "🔑 **Invalid API Key**\n\nAuthentication failed. Please check the **'🔑 Google API Key'** provided in the sidebar. Ensure it is active and has permissions."),
+
+    # 3. Prompt/Template Construction Errors
+    (("template", "placeholder"),
+     "🧩 **Prompt Template Error**\n\nFailed to construct the Agent's reasoning prompt. Please check the prompt structure."),
+
+    # 4. Agent reasoning loops or unparseable LLM formats
+    (("parsing",),
+     "😵‍💫 **Reasoning Error**\n\nThe AI encountered an issue structuring its response. Please rephrase."),
+
+    # 5. Google Calendar OAuth/Toolkit Authentication Issues
+    (("invalid_grant", "credentials", "token", "oauth"),
+     "🔐 **Google Calendar Auth Error**\n\nThe system could not authenticate with your Google Calendar. Please verify your 'token.json' file."),
+)
+
+# Calendar API failures (e.g., a 403 from a native CalendarToolkit tool) are reported separately,
+# so their status codes are never mistaken for the Gemini key errors matched by '_ERROR_MAP'.
+_CALENDAR_ERROR_MESSAGE = (
+    "📅 **Google Calendar Error**\n\nThe Google Calendar API rejected the request (HTTP {status}). "
+    "Please verify that your 'token.json' is valid and grants access to this calendar."
+)
+
+def _describe_error(e, fallback):
+    """
+    Maps an exception to a user-friendly message using a single lower-case pass over '_ERROR_MAP'.
+    Google Calendar 'HttpError's are classified first, before any Gemini-specific keyword can match.
+    Returns 'fallback' when no known keyword matches.
+    """
+    if isinstance(e, HttpError):
+        return _CALENDAR_ERROR_MESSAGE.format(status=e.resp.status)
+
+    error_msg = str(e).lower()
+    return next(
+        (message for keywords, message in _ERROR_MAP if any(k in error_msg for k in keywords)),
+        fallback
+    )
+
 # ==========================================
 # APPLICATION CONFIGURATION & INITIALIZATION
 # ==========================================
@@ -42,6 +97,22 @@ st.set_page_config(
 # Prevents KeyError exceptions during Streamlit's reactive re-runs.
 init_state()
 
+@st.cache_resource(show_spinner=False)
+def _background_pool():
+    """
+    Shared worker pool for blocking network calls that can overlap with the rest of the script run.
+    """
+    return ThreadPoolExecutor(max_workers=4)
+
+# Captures the Exact Current System Time (WIB) once per script run.
+# Every date-dependent component (sidebar agenda, agent time context) derives from this single reading.
+run_started_at = datetime.now(CALENDAR_TZINFO)
+today_iso = run_started_at.date().isoformat()
+
+# Kicks off today's agenda fetch immediately, so its Calendar API latency overlaps with
+# UI rendering and AI engine warm-up instead of blocking the sidebar. The result is collected below.
+agenda_future = _background_pool().submit(get_today_agenda, today_iso)
+
 
 # ==========================================
 # MAIN USER INTERFACE
@@ -96,7 +167,8 @@ with st.sidebar:
         "🔑 Google API Key",
         type="password",
         key="google_api_key",
-        on_change=change_on_api_key,
+        on_change=reset_session,
+        args=("session",),
         help="Provide your Google Gemini API Key to authenticate and power the NovaCal AI agent."
     )
 
@@ -108,18 +180,10 @@ with st.sidebar:
     # Renders a clear visual hierarchy for the agenda section.
     st.subheader("📋 Today's Agenda") # <-- KITA TAMBAHIN HEADER KHUSUS JADWAL!
     
-    # Automatically fetches and renders today's agenda upon sidebar load.
-    today_date = date.today().strftime("%Y-%m-%d")
-    
-    try: 
-        today_schedules = get_all_schedules.invoke({
-            "start_date": today_date,
-            "end_date": today_date
-        })
-        st.info(today_schedules)
-    except Exception as e:
-        # Added warning icon to the error state for better UX.
-        st.error(f"⚠️ Failed to load today's schedule: {e}") # <-- ERRORNYA JUGA KITA KASIH ICON
+    # Reserves the agenda slot; it is filled once the background fetch completes (see below).
+    # The fetch is memoized for a short TTL, so routine reruns do not re-hit the Calendar API.
+    agenda_slot = st.empty()
+    agenda_slot.caption("⏳ Loading today's agenda...")
 
     st.divider()
 
@@ -129,7 +193,8 @@ with st.sidebar:
     # Instantiates the UI clearing mechanism.
     st.button(
         "🧹 Clear Screen Only",
-        on_click=reset_chat_display,
+        on_click=reset_session,
+        args=("display",),
         use_container_width=True,
         help="Clears the chat interface to declutter the screen, while preserving the AI's conversation memory."
     )
@@ -137,7 +202,8 @@ with st.sidebar:
     # Triggers a comprehensive application state reset.
     st.button(
         "🔄 Full System Reset",
-        on_click=reset_state,
+        on_click=reset_session,
+        args=("full",),
         type="primary",
         use_container_width=True,
         help="Executes a complete system wipe: clears chat history, AI memory, and tool connections."
@@ -168,16 +234,10 @@ with st.sidebar:
 # 1. Verify if the user has securely provided a Google Gemini API Key
 if st.session_state.google_api_key:
     
-    # 2. Implement a Singleton-like pattern: Initialize the LLM only if it doesn't already exist.
-    # This prevents redundant re-instantiation during Streamlit's reactive UI re-runs, optimizing performance.
+    # 2. Implement a Singleton-like pattern: Attach the LLM only if it doesn't already exist.
+    # The instance itself is cached per API key, so it is shared across sessions and re-runs.
     if st.session_state.llm is None:
-        st.session_state.llm = ChatGoogleGenerativeAI(
-            model="gemini-2.5-flash", 
-            google_api_key=st.session_state.google_api_key,
-            # A low temperature (0.3) ensures the model's outputs are deterministic and precise.
-            # This strictness is CRITICAL for reliable JSON generation during Google Calendar tool execution.
-            temperature=0.3 
-        )
+        st.session_state.llm = get_llm(st.session_state.google_api_key)
         # Provide subtle visual feedback that the backend AI is primed and ready
         st.toast("AI Engine initialized successfully!", icon="🧠")
         
@@ -191,30 +251,136 @@ if st.session_state.llm is not None:
     
     # Check if the memory buffer is uninitialized (None). 
     # By skipping creation if it already exists, we preserve the user's ongoing chat history and contextual flow.
+    # The buffer is a plain list of LangChain messages; it is trimmed to a token budget before every turn.
     if st.session_state.agent_memory is None:
-        st.session_state.agent_memory = ConversationBufferMemory(
-            memory_key="chat_history", 
-            return_messages=True
-        )
+        st.session_state.agent_memory = []
+
+# ==========================================
+# DAILY SCHEDULE WIDGET (DEFERRED RENDER)
+# ==========================================
+# Collects the background agenda fetch and renders it into the reserved sidebar slot.
+try: 
+    today_schedules = agenda_future.result(timeout=5)
+    agenda_slot.info(today_schedules)
+except FuturesTimeoutError:
+    agenda_slot.error("⚠️ Failed to load today's schedule: the Google Calendar API took too long to respond.")
+except Exception as e:
+    # Added warning icon to the error state for better UX.
+    agenda_slot.error(f"⚠️ Failed to load today's schedule: {e}") # <-- ERRORNYA JUGA KITA KASIH ICON
 
 # ==========================================
 # AGENT INITIALIZATION & PROMPT ENGINEERING
 # ==========================================
+# Standard Operating Procedures (SOP) for the agent, kept flush-left at module level so no source-code
+# indentation whitespace is sent to the LLM on every turn. '{current_datetime}' and '{today}' are filled per turn.
+AGENT_SYSTEM_PROMPT = """You are an elite, highly capable Personal Assistant managing the user's Google Calendar.
+CURRENT SYSTEM TIME: {current_datetime}
+
+CRITICAL RULES:
+1. CALENDAR ID: Whenever a tool requires 'calendar_id', ALWAYS use exactly the string 'primary'.
+2. TIME CONTEXT: Base all date and time calculations strictly on the CURRENT SYSTEM TIME.
+3. LANGUAGE: Always respond naturally in the EXACT SAME language the user typed.
+4. CONVERSATIONAL MEMORY: You have access to the user's previous messages in 'chat_history'. ALWAYS check this history first to find missing details (like event title, date, or time). DO NOT ask the user for information they have already provided in previous messages.
+5. PARAMETER SAFETY:
+    - If required parameters are STILL missing after checking chat_history, ask the user for clarification before calling any tool.
+    - Never invent dates or times.
+    - Do not assume default values unless explicitly provided by the user.
+
+STANDARD OPERATING PROCEDURES (SOP) FOR CALENDAR ACTIONS:
+
+A. CREATING AN EVENT:
+- Use the 'CalendarCreateEvent' tool directly with the details provided.
+
+B. DELETING AN EVENT:
+- Step 1: You MUST FIRST use the 'get_id_of_schedules' tool (search by keyword) or 'get_all_schedules' tool (search by date. ALWAYS provide BOTH 'start_date' and 'end_date' in YYYY-MM-DD) to find the event.
+- Step 2: Extract the 'EVENT_ID' from the tool's response.
+- Step 3: Use the 'CalendarDeleteEvent' tool using that 'EVENT_ID'.
+
+C. EDITING/UPDATING AN EVENT:
+- Step 1: Use 'get_id_of_schedules' or 'get_all_schedules' (ALWAYS provide BOTH 'start_date' and 'end_date' in YYYY-MM-DD) to get the 'EVENT_ID' and the FULL original details.
+- Step 2 (The Priority): Try to use 'CalendarUpdateEvent' using the 'EVENT_ID'. You MUST pass the updated fields AND keep the unchanged fields from Step 1.
+- Step 3 (The Fallback): IF Step 2 fails (due to error or missing data), use the "Swap Method": 
+    a. Create a NEW event with 'CalendarCreateEvent'.
+    b. Delete the OLD event with 'CalendarDeleteEvent' using the 'EVENT_ID'.
+
+D. READING/DISPLAYING SCHEDULES (e.g., "What is my schedule today?"):
+- Use the 'get_all_schedules' tool.
+- You MUST provide BOTH 'start_date' and 'end_date' in YYYY-MM-DD format (e.g., '{today}'). If asking for a single day, use the same date for both.
+- Summarize the results naturally for the user. IMPORTANT: If 'get_all_schedules' returns holidays or all-day events, make sure to mention them clearly to the user.
+
+E. SEARCHING SPECIFIC EVENTS (e.g., "When is my 'Team Sync' meeting?"):
+- Use the 'get_id_of_schedules' tool with the keyword (e.g., "Team Sync").
+
+F. CHECKING AVAILABILITY (e.g., "Am I free on Friday afternoon?"):
+- Use the 'get_busy_slots' tool with BOTH 'start_date' and 'end_date' in YYYY-MM-DD format.
+- Compare the requested time against the returned busy intervals. Use 'get_all_schedules' instead only if the user also wants to know WHAT is scheduled.
+- 'get_busy_slots' does NOT include public holidays. If the user asks about holidays, use 'get_all_schedules' instead.
+"""
+
+@st.cache_resource(show_spinner=False)
+def _build_prompt_template():
+    """
+    Compiles the Custom Hybrid Tool-Calling Prompt exactly once per server process.
+    This serves as the core "Brain" of the agent, defining strict Standard Operating Procedures (SOP) for Calendar management.
+    Time-sensitive values are left as '{current_datetime}' and '{today}' placeholders and supplied on every turn,
+    so Streamlit re-runs never re-parse the large SOP template.
+    """
+    return ChatPromptTemplate.from_messages([
+        ("system", AGENT_SYSTEM_PROMPT),
+        
+        MessagesPlaceholder(variable_name="chat_history"),
+        ("human", "{input}"),
+        MessagesPlaceholder(variable_name="agent_scratchpad"),
+    ])
+
+def _finish_as_text(step):
+    """
+    Final output-parsing stage of the agent pipeline.
+    Gemini may return the final answer as a list of content parts; this flattens it once, inside the agent,
+    so the executor's 'output' is always a plain string. Tool-call steps pass through untouched.
+    """
+    if isinstance(step, AgentFinish) and isinstance(step.return_values.get("output"), list):
+        text = "".join(
+            part["text"] if isinstance(part, dict) else part
+            for part in step.return_values["output"]
+            if isinstance(part, str) or (isinstance(part, dict) and "text" in part)
+        )
+        return AgentFinish(return_values={**step.return_values, "output": text}, log=step.log)
+    return step
+
+# 'max_entries' bounds the executors left behind when a Full System Reset re-keys the cache.
+@st.cache_resource(show_spinner=False, max_entries=8)
+def _build_executor(_llm, _tools, llm_id: int, tools_id: int):
+    """
+    Builds the Agent Executor once per (LLM instance, toolset) pair and shares it across all sessions.
+    Streamlit does not hash underscore-prefixed arguments, so 'llm_id' and 'tools_id' key the cache.
+    The executor holds no conversational or time state: each turn passes its own 'chat_history' and time context.
+    """
+    # 1. Bind the Reasoning Engine (The Brain) to the precompiled prompt.
+    # The time context ('current_datetime', 'today') is supplied per turn at invoke time.
+    # The trailing '_finish_as_text' stage guarantees the final answer is emitted as a plain string.
+    agent_brain = create_tool_calling_agent(
+        llm=_llm,
+        tools=_tools,
+        prompt=_build_prompt_template()
+    ) | RunnableLambda(_finish_as_text)
+
+    # 2. Initialize the Runtime Executor (The Body)
+    return AgentExecutor(
+        agent=agent_brain,
+        tools=_tools,
+        # Enable robust error handling to prevent application crashes from LLM hallucinations
+        handle_parsing_errors=True,
+    )
+
 # Only initialize the Agent Executor if it doesn't exist, AND the core dependencies (LLM, Memory) are ready.
 if "agent_executor" not in st.session_state \
     and st.session_state.llm is not None \
     and st.session_state.agent_memory is not None:
 
     try:
-        # 1. Initialize the Google Calendar Toolkit
-        toolkit = CalendarToolkit()
-        calendar_tools = toolkit.get_tools()
-
-        # Filter out native LangChain search tools (they are buggy/broken for our use case)
-        used_tools = [t for t in calendar_tools if "search" not in t.name.lower() and "get" not in t.name.lower()]
-        
-        # Inject our custom, highly-optimized tools
-        tools = used_tools + [get_id_of_schedules, get_all_schedules]
+        # 1. Retrieve the cached Google Calendar toolset (native tools filtered + custom tools injected)
+        tools = get_calendar_tools()
 
         st.toast("✅ Successfully connected to Google Calendar API!", icon="🗓️")
         
@@ -224,99 +390,22 @@ if "agent_executor" not in st.session_state \
         st.stop()
     
     try:
-        # 2. Capture the Exact Current System Time for Contextual Accuracy
-        wib_timezone = timezone(timedelta(hours=7))
-        current_datetime = datetime.now(wib_timezone).strftime("%Y-%m-%d %H:%M:%S WIB")
-
-        # 3. Construct the Custom Hybrid Tool-Calling Prompt
-        # This serves as the core "Brain" of the agent, defining strict Standard Operating Procedures (SOP) for Calendar management.
-        prompt = ChatPromptTemplate.from_messages([
-            ("system", f"""You are an elite, highly capable Personal Assistant managing the user's Google Calendar.
-            CURRENT SYSTEM TIME: {current_datetime}
-            
-            CRITICAL RULES:
-            1. CALENDAR ID: Whenever a tool requires 'calendar_id', ALWAYS use exactly the string 'primary'.
-            2. TIME CONTEXT: Base all date and time calculations strictly on the CURRENT SYSTEM TIME.
-            3. LANGUAGE: Always respond naturally in the EXACT SAME language the user typed.
-            4. CONVERSATIONAL MEMORY: You have access to the user's previous messages in 'chat_history'. ALWAYS check this history first to find missing details (like event title, date, or time). DO NOT ask the user for information they have already provided in previous messages.
-            5. PARAMETER SAFETY:
-                - If required parameters are STILL missing after checking chat_history, ask the user for clarification before calling any tool.
-                - Never invent dates or times.
-                - Do not assume default values unless explicitly provided by the user.
-            6. BANNED TOOLS: NEVER use 'CalendarSearchEvents', 'search_events', or 'get_events'. They are broken.
-            
-            STANDARD OPERATING PROCEDURES (SOP) FOR CALENDAR ACTIONS:
-            
-            A. CREATING AN EVENT:
-            - Use the 'CalendarCreateEvent' tool directly with the details provided.
-            
-            B. DELETING AN EVENT:
-            - Step 1: You MUST FIRST use the 'get_id_of_schedules' tool (search by keyword) or 'get_all_schedules' tool (search by date. ALWAYS provide BOTH 'start_date' and 'end_date' in YYYY-MM-DD) to find the event.
-            - Step 2: Extract the 'EVENT_ID' from the tool's response.
-            - Step 3: Use the 'CalendarDeleteEvent' tool using that 'EVENT_ID'.
-            
-            C. EDITING/UPDATING AN EVENT:
-            - Step 1: Use 'get_id_of_schedules' or 'get_all_schedules' (ALWAYS provide BOTH 'start_date' and 'end_date' in YYYY-MM-DD) to get the 'EVENT_ID' and the FULL original details.
-            - Step 2 (The Priority): Try to use 'CalendarUpdateEvent' using the 'EVENT_ID'. You MUST pass the updated fields AND keep the unchanged fields from Step 1.
-            - Step 3 (The Fallback): IF Step 2 fails (due to error or missing data), use the "Swap Method": 
-                a. Create a NEW event with 'CalendarCreateEvent'.
-                b. Delete the OLD event with 'CalendarDeleteEvent' using the 'EVENT_ID'.
-            
-            D. READING/DISPLAYING SCHEDULES (e.g., "What is my schedule today?"):
-            - Use the 'get_all_schedules' tool.
-            - You MUST provide BOTH 'start_date' and 'end_date' in YYYY-MM-DD format (e.g., '{current_datetime[:10]}'). If asking for a single day, use the same date for both.
-            - Summarize the results naturally for the user. IMPORTANT: If 'get_all_schedules' returns holidays or all-day events, make sure to mention them clearly to the user.
-            
-            E. SEARCHING SPECIFIC EVENTS (e.g., "When is my 'Team Sync' meeting?"):
-            - Use the 'get_id_of_schedules' tool with the keyword (e.g., "Team Sync").
-            """),
-            
-            MessagesPlaceholder(variable_name="chat_history"),
-            ("human", "{input}"),
-            MessagesPlaceholder(variable_name="agent_scratchpad"),
-        ])
-
-        # 4. Bind the Reasoning Engine (The Brain)
-        agent_brain = create_tool_calling_agent(
-            llm=st.session_state.llm,
-            tools=tools,
-            prompt=prompt
-        )
-
-        # 5. Initialize the Runtime Executor (The Body)
-        st.session_state.agent_executor = AgentExecutor(
-            agent=agent_brain,
-            tools=tools,
-            # Inject persistent memory to maintain conversational context
-            memory=st.session_state.agent_memory,
-            # Enable robust error handling to prevent application crashes from LLM hallucinations
-            handle_parsing_errors=True,
+        # 2. Retrieve the shared Runtime Executor for this exact LLM instance and toolset
+        # Object identities key the cache, so a rebuilt LLM or toolset yields a fresh executor.
+        st.session_state.agent_executor = _build_executor(
+            st.session_state.llm,
+            tools,
+            id(st.session_state.llm),
+            id(tools)
         )
 
     except Exception as e:
         # --- Engine Initialization Error Handling ---
-        error_msg = str(e).lower()
-        answer = "" 
-
-        # 1. Handle API Quota Limits (Common with Gemini Free Tier)
-        if "429" in error_msg or "quota" in error_msg or "resource exhausted" in error_msg:
-            answer = "🚨 **API Quota Exceeded**\n\nThe AI Engine is temporarily busy. Google Gemini's limits have been reached. Please wait a minute and try again."
-            
-        # 2. Handle Invalid API Key (Authentication failed)
-        elif "api_key" in error_msg or "403" in error_msg or "permission denied" in error_msg:
-             answer = "🔑 **Invalid API Key**\n\nAuthentication failed. Please check the **'🔑 Google API Key'** provided in the sidebar. Ensure it is active and has permissions."
-
-        # 3. Handle Prompt/Template Construction Errors
-        elif "template" in error_msg or "placeholder" in error_msg:
-             answer = "🧩 **Prompt Template Error**\n\nFailed to construct the Agent's reasoning prompt. Please check the prompt structure."
-
-        # 4. Handle Toolkit Authentication Issues (Replaced Database error)
-        elif "credentials" in error_msg or "token" in error_msg or "oauth" in error_msg:
-             answer = "🔐 **Google Calendar Auth Error**\n\nThe system could not authenticate with your Google Calendar. Please verify your 'token.json' file."
-
-        # 5. Handle General/Unknown Errors (Catch-all)
-        else:
-            answer = f"❌ **System Initialization Failed**\n\nAn unexpected error occurred while building the Agent Engine.\n\n**Technical Details:** `{error_msg}`"
+        # Classify the failure via the shared error table, with a catch-all for unknown errors
+        answer = _describe_error(
+            e,
+            f"❌ **System Initialization Failed**\n\nAn unexpected error occurred while building the Agent Engine.\n\n**Technical Details:** `{e}`"
+        )
 
         # Display the structured error message
         st.error(answer, icon="⚠️")
@@ -389,7 +478,7 @@ if options == "Chat AI":
         if st.session_state.llm is None:
             st.warning("⚠️ AI Engine is offline. Please authenticate with your API Key in the sidebar.", icon="🚫")
             
-        elif not st.session_state.agent_executor:
+        elif not st.session_state.get("agent_executor"):
             st.warning("⚠️ Agent pipeline is not initialized. Please perform a Full System Reset.", icon="🤖")
 
         else:
@@ -406,54 +495,59 @@ if options == "Chat AI":
                     # (Tool selection, Calendar API execution, and Observation) in real-time.
                     st_callback = StreamlitCallbackHandler(st.container())
 
-                    # Invoke the Calendar Tool-Calling Agent
-                    # Passes 'st_callback' so intermediate reasoning steps are rendered dynamically.
-                    response = st.session_state.agent_executor.invoke(
-                        {"input": prompt_text},
-                        {"callbacks": [st_callback]}
+                    # Reserve a slot below the thought process where the final answer is rendered
+                    answer_placeholder = st.empty()
+                    final_answer = ""
+
+                    # Bound the replayed conversation to the most recent turns that fit the token budget.
+                    # Counting is approximate and local, so trimming never costs an extra API call.
+                    chat_history = trim_messages(
+                        st.session_state.agent_memory,
+                        token_counter=count_tokens_approximately,
+                        max_tokens=2000,
+                        strategy="last",
+                        start_on="human",
+                        include_system=True
                     )
 
-                    # 5. Extract, Validate, and Render the Final Output
-                    if "output" in response and len(response["output"]) > 0:
-                        # Provide a graceful fallback string if the output is malformed
-                        final_answer = response.get("output", "Sorry, I am unable to process that scheduling request right now.")
-                        
-                        # Type-check and flatten the response if the LLM returns a chunked list
-                        if isinstance(final_answer, list):
-                            cleaned_text = ""
-                            for part in final_answer:
-                                if isinstance(part, dict) and "text" in part:
-                                    cleaned_text += part["text"]
-                                elif isinstance(part, str):
-                                    cleaned_text += part
-                            final_answer = cleaned_text
-                            
-                        # Render the final synthesized natural language response
-                        st.markdown(final_answer)
-
-                    # 6. Commit the AI's response to the session state memory
+                    # Submitting a message starts this run, so its start time is the fresh CURRENT SYSTEM TIME
+                    current_datetime = run_started_at.strftime("%Y-%m-%d %H:%M:%S WIB")
+
+                    # Stream the Calendar Tool-Calling Agent
+                    # Passes 'st_callback' so intermediate reasoning steps are rendered dynamically.
+                    # Intermediate chunks carry 'actions'/'steps'; the answer arrives in chunks with an 'output' key.
+                    for chunk in st.session_state.agent_executor.stream(
+                        {
+                            "input": prompt_text,
+                            "chat_history": chat_history,
+                            "current_datetime": current_datetime,
+                            "today": today_iso
+                        },
+                        {"callbacks": [st_callback]}
+                    ):
+                        # Invalidate cached calendar reads as soon as a calendar-mutating tool has run
+                        for step in chunk.get("steps", []):
+                            on_tool_executed(step.action.tool)
+
+                        # 5. Render the Output as soon as it arrives (already a plain string, see '_finish_as_text')
+                        if "output" in chunk:
+                            final_answer = chunk["output"]
+                            answer_placeholder.markdown(final_answer)
+
+                    # Provide a graceful fallback string if the agent produced no usable output
+                    if not final_answer:
+                        final_answer = "Sorry, I am unable to process that scheduling request right now."
+                        answer_placeholder.markdown(final_answer)
+
+                    # 6. Commit the AI's response to the UI history and the turn to the agent's memory
                     st.session_state.messages.append({"role": "ai", "content": final_answer})
+                    st.session_state.agent_memory.extend([
+                        HumanMessage(content=prompt_text),
+                        AIMessage(content=final_answer)
+                    ])
 
                 except Exception as e:
                     # --- Comprehensive Runtime Error Handling ---
-                    error_str = str(e).lower()
-
-                    if "429" in error_str or "resource" in error_str:
-                        # Handle Google API rate limits or quota exhaustion
-                        st.error("⏳ API Quota Exceeded. Please wait a moment or verify your Google Cloud billing status.", icon="🛑")
-
-                    elif "api_key" in error_str or "400" in error_str:
-                        # Handle authentication failures
-                        st.error("🔑 Authentication Failed. Please verify your Google Gemini API Key in the sidebar.", icon="🚫")
-
-                    elif "parsing" in error_str:
-                        # Handle Agent reasoning loops or unparseable LLM formats
-                        st.error("🧩 Reasoning Error. The AI encountered an issue structuring its response. Please rephrase.", icon="😵‍💫")
-
-                    elif "invalid_grant" in error_str or "token" in error_str:
-                        # Replaced SQL 'operationalerror' with Calendar OAuth Token Error
-                        st.error("🔐 OAuth Token Expired. Please re-authenticate your token.json file with Google Calendar.", icon="📉")
-
-                    else:
-                        # Fallback for unexpected system or API errors
-                        st.error(f"❌ An unexpected system error occurred: {str(e)}", icon="🚨")
\ No newline at end of file
+                    # Reuses the same error table as engine initialization, falling back to the raw error
+                    answer = _describe_error(e, f"❌ An unexpected system error occurred: {e}")
+                    st.error(answer, icon="🚨")
\ No newline at end of file
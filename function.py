@@ -1,9 +1,144 @@
-import os
 import json
+import asyncio
+import queue
+import threading
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Literal
+from zoneinfo import ZoneInfo
+import httplib2
 import streamlit as st
 from google.oauth2.credentials import Credentials
+from google_auth_httplib2 import AuthorizedHttp, Request
 from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
+from googleapiclient.http import HttpRequest
 from langchain.tools import tool
+from langchain_core.tools import StructuredTool
+from langchain_google_community import CalendarToolkit
+from langchain_google_genai import ChatGoogleGenerativeAI
+
+# Native CalendarToolkit tools excluded from the agent (they are buggy/broken for our use case).
+# Names are compared case-insensitively against 'tool.name'.
+_BANNED_TOOLS = frozenset({
+    "calendarsearchevents",
+    "search_events",
+    "get_events",
+    "get_calendars_info",
+    "get_current_datetime",
+})
+
+# Custom tools that only read the calendar; any other tool call is treated as a calendar mutation.
+_READ_ONLY_TOOLS = frozenset({"get_id_of_schedules", "get_all_schedules", "get_busy_slots"})
+
+# OAuth scope granting full read/write access to the user's calendars.
+_SCOPES = ['https://www.googleapis.com/auth/calendar']
+
+# All calendar queries and responses are expressed in Western Indonesia Time (WIB).
+_TIMEZONE = "Asia/Jakarta"
+# Public: app.py derives the agent's current date/time from the same zone the tools use for their day bounds.
+CALENDAR_TZINFO = ZoneInfo(_TIMEZONE)
+
+# Socket timeout (seconds) for Calendar API connections, so a stalled request fails fast and is retried.
+_HTTP_TIMEOUT = 10
+
+# Transient Calendar API failures (5xx, 429, rate-limit 403s, dropped connections) are retried
+# this many times by googleapiclient, with randomized exponential backoff between attempts.
+_NUM_RETRIES = 3
+
+# Partial-response mask: only the fields our formatters read (plus the pagination cursor) cross the wire.
+_EVENT_FIELDS = "items(id,summary,start,end),nextPageToken"
+
+# Indonesian public holidays calendar, merged into the date-range tool's output alongside the primary calendar.
+_HOLIDAY_CALENDAR_ID = 'id.indonesian#holiday@group.v.calendar.google.com'
+
+# Date ranges covering at most this many calendar years read holidays from the per-year cache;
+# wider ranges fall back to one live holiday query.
+_HOLIDAY_CACHE_MAX_YEARS = 2
+
+# Upper bound on events collected per calendar query by the date-range tool. Pages are followed until
+# this cap is reached, keeping the agent's context bounded on very busy calendars.
+_MAX_TOOL_EVENTS = 250
+
+# Streamlit's primary brand red color, used for every event on the visual calendar.
+_EVENT_COLOR = "#FF4B4B"
+
+# The visual calendar loads events within this many days before and after today.
+_VISUAL_WINDOW_DAYS = 90
+
+# ==========================================
+# IN-MEMORY GOOGLE CREDENTIAL LOADER
+# ==========================================
+def _load_google_credentials():
+    """
+    Builds the Google OAuth credentials in memory.
+    Prefers the raw token JSON stored in st.secrets (deployment), falling back to a local
+    'token.json' file for development setups without secrets.
+    """
+    if "files" in st.secrets and "google_calendar_token" in st.secrets["files"]:
+        info = json.loads(st.secrets["files"]["google_calendar_token"])
+        return Credentials.from_authorized_user_info(info, _SCOPES)
+
+    return Credentials.from_authorized_user_file('token.json', _SCOPES)
+
+@st.cache_resource(show_spinner=False)
+def _get_google_credentials():
+    """
+    Returns the process-wide Google OAuth credentials, parsed from st.secrets or 'token.json' only once.
+    Shared by the cached Calendar client and its per-thread transports, so a refreshed
+    access token is immediately visible to every worker thread.
+    """
+    return _load_google_credentials()
+
+# Serializes access-token refreshes, so concurrent tool calls don't each trigger their own OAuth round-trip.
+_CREDS_REFRESH_LOCK = threading.Lock()
+
+def _ensure_fresh_credentials(creds):
+    """
+    Proactively refreshes a missing or expired access token before a request is sent.
+    Validity is re-checked under the lock, so threads that were waiting reuse the token
+    obtained by the first one instead of refreshing again.
+    """
+    if not creds.valid and creds.refresh_token:
+        with _CREDS_REFRESH_LOCK:
+            if not creds.valid:
+                creds.refresh(Request(httplib2.Http(timeout=_HTTP_TIMEOUT)))
+
+class _LockedRefreshHttp(AuthorizedHttp):
+    """
+    Authorized transport that runs the locked token refresh on every send, including googleapiclient's
+    'num_retries' re-sends, so the token is checked when the request actually goes out rather than when it is built.
+    Only a 401 response (e.g., a token revoked server-side) still falls back to the parent's own, unlocked refresh.
+    """
+    def request(self, *args, **kwargs):
+        _ensure_fresh_credentials(self.credentials)
+        return super().request(*args, **kwargs)
+
+class _PooledHttpRequest(HttpRequest):
+    """
+    API request that borrows an authorized transport from a process-wide pool for the duration of 'execute'.
+    httplib2.Http is not thread-safe, so a transport is only ever used by one request at a time; returning it
+    afterwards lets its keep-alive connection (and TLS session) outlive Streamlit's short-lived script threads.
+    """
+    def __init__(self, transports, creds, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._transports = transports
+        self._creds = creds
+
+    def execute(self, http=None, num_retries=0):
+        # An explicitly supplied transport bypasses the pool
+        if http is not None:
+            return super().execute(http=http, num_retries=num_retries)
+
+        # Reuse the most recently returned transport (warmest connection), or open a new one if all are busy
+        try:
+            transport = self._transports.get_nowait()
+        except queue.Empty:
+            transport = _LockedRefreshHttp(self._creds, http=httplib2.Http(timeout=_HTTP_TIMEOUT))
+
+        try:
+            return super().execute(http=transport, num_retries=num_retries)
+        finally:
+            self._transports.put(transport)
 
 # ==========================================
 # SESSION STATE MANAGEMENT
@@ -15,25 +150,6 @@ def init_state():
     during Streamlit's reactive UI re-runs.
     """
 
-    # ==========================================
-    # DYNAMIC CREDENTIAL GENERATOR FOR STREAMLIT
-    # ==========================================
-    # LangChain's CalendarToolkit strictly requires physical 'credentials.json' and 'token.json' files.
-    # Since we cannot upload these to GitHub, we store their raw JSON strings in st.secrets
-    # and dynamically write them to temporary physical files on the server upon startup.
-
-    # 1. Generate 'credentials.json' from st.secrets if it doesn't exist
-    if not os.path.exists("credentials.json"):
-        if "files" in st.secrets and "google_calendar_credentials" in st.secrets["files"]:
-            with open("credentials.json", "w") as f:
-                f.write(st.secrets["files"]["google_calendar_credentials"])
-
-    # 2. Generate 'token.json' from st.secrets if it doesn't exist
-    if not os.path.exists("token.json"):
-        if "files" in st.secrets and "google_calendar_token" in st.secrets["files"]:
-            with open("token.json", "w") as f:
-                f.write(st.secrets["files"]["google_calendar_token"])
-
     # ==========================================
     # CORE SESSION STATE VARIABLES
     # ==========================================
@@ -55,63 +171,100 @@ def init_state():
         st.session_state.agent_memory = None
 
 # ==========================================
-# SYSTEM RESET CALLBACKS
+# CACHED GOOGLE CALENDAR CLIENT
 # ==========================================
-def change_on_api_key():
+@st.cache_resource(show_spinner=False)
+def _get_calendar_service():
     """
-    Callback function triggered when the user modifies the API Key input.
-    Executes a 'Hard Reset' of the environment to ensure the newly provided credential 
-    is properly applied to all future LLM and agent instances.
+    Builds the authenticated Google Calendar API client exactly once per server process.
+    Streamlit re-runs the whole script on every widget interaction, so re-parsing the OAuth token
+    and re-constructing the discovery-based client on each run would add avoidable latency.
+    Shared by the visual calendar, the custom AI tools, and the CalendarToolkit.
+    Missing or expired access tokens are refreshed under a lock as each request is sent (see '_LockedRefreshHttp').
+    Call '_get_calendar_service.clear()' to force a rebuild (e.g., after a system reset).
     """
-    # 1. Clear the UI chat history to prevent contextual mismatches with the new key
-    st.session_state.messages = []
-    
-    # 2. Nullify the LLM and memory instances to force a fresh initialization
-    st.session_state.llm = None
-    st.session_state.agent_memory = None
-    
-    # 3. Purge the existing Agent Executor from the session state completely.
-    # Using .pop() guarantees the key is removed, forcing the app to rebuild the AI pipeline.
-    st.session_state.pop("agent_executor", None)
+    creds = _get_google_credentials()
+
+    # Idle authorized transports shared by every session and thread; it grows to the peak request concurrency
+    transports = queue.LifoQueue()
+
+    def build_request(http, *args, **kwargs):
+        # Each request checks a transport out of the pool only while it executes (see '_PooledHttpRequest')
+        return _PooledHttpRequest(transports, creds, http, *args, **kwargs)
     
-    # 4. Display a brief confirmation notification to the user
-    st.toast("API Key updated! System environment reset.", icon="🔄")
+    # 'static_discovery=True' loads the discovery document bundled with the library (no HTTP fetch);
+    # 'cache_discovery=False' silences the legacy oauth2client file-cache warning,
+    # since the client object itself is cached by Streamlit instead.
+    return build(
+        'calendar', 'v3',
+        credentials=creds,
+        requestBuilder=build_request,
+        cache_discovery=False,
+        static_discovery=True
+    )
 
-def reset_state():
+# ==========================================
+# CACHED LANGUAGE MODEL CLIENT
+# ==========================================
+@st.cache_resource(show_spinner=False)
+def get_llm(api_key: str):
     """
-    Callback function triggered by the 'Full System Reset' UI button.
-    Executes a comprehensive 'Hard Reset': purges the Chat UI, destroys the Agent's conversational memory, 
-    and severs any active Google Calendar tool context. 
-    Utilize this to return the application to a pure 'Tabula Rasa' (blank slate) state.
+    Returns a Gemini chat model instance shared across all sessions using the same API key.
+    Unlike a per-session singleton, a fresh browser tab with a known key reuses the existing
+    authenticated client instead of opening a new one.
     """
-    # 1. Purge the visible chat history at the UI level
-    st.session_state.messages = []
-    
-    # 2. Reset core AI components to enforce re-instantiation on the next user interaction
-    st.session_state.llm = None
-    st.session_state.agent_memory = None 
-    
-    # 3. Terminate the active Agent Executor process
-    st.session_state.pop("agent_executor", None)
-    
-    # 4. Provide visual feedback of the successful reset operation
-    st.toast("System fully reset. AI memory and context wiped!", icon="🔄")
+    return ChatGoogleGenerativeAI(
+        model="gemini-2.5-flash", 
+        google_api_key=api_key,
+        # A low temperature (0.3) ensures the model's outputs are deterministic and precise.
+        # This strictness is CRITICAL for reliable JSON generation during Google Calendar tool execution.
+        temperature=0.3 
+    )
 
-def reset_chat_display():
+# ==========================================
+# SYSTEM RESET CALLBACKS
+# ==========================================
+# Toast feedback displayed after each reset level completes.
+_RESET_TOASTS = {
+    "display": ("Screen cleared! AI context retained.", "🧹"),
+    "session": ("Session reset! Chat history and AI memory cleared.", "🔄"),
+    "full": ("System fully reset. AI memory and context wiped!", "🔄"),
+}
+
+def reset_session(level: Literal["display", "session", "full"]):
     """
-    Callback function triggered by the 'Clear Screen Only' UI button.
-    Executes a UI-level reset by purging the visible chat messages from the Streamlit interface.
-    Crucially, the underlying LLM conversational memory ('agent_memory') is PRESERVED, 
-    allowing the AI to retain contextual awareness of prior interactions despite the blank screen.
+    Shared callback behind every reset control. Each level performs only the minimal state mutation it needs:
+    - 'display' ('Clear Screen Only' button): purges the visible chat messages. The agent's conversational
+      memory ('agent_memory') is PRESERVED, so the AI retains context despite the blank screen.
+    - 'session' (API Key input change): additionally destroys the conversational memory and detaches the
+      session's LLM and Agent Executor, so the new key is applied. Shared cached clients stay warm.
+    - 'full' ('Full System Reset' button): additionally drops every cached client (Gemini, Google Calendar,
+      toolkit, calendar reads), returning the application to a pure 'Tabula Rasa' (blank slate) state.
     """
-    # 1. Purge the message history array to clear the graphical user interface (GUI)
+    # 1. Purge the visible chat history at the UI level (every level)
     st.session_state.messages = []
-    
-    # 2. NOTE: We intentionally bypass nullifying 'st.session_state.agent_memory' here.
-    # This design choice ensures the LangChain memory buffer remains intact for continuity.
-    
-    # 3. Display a brief confirmation notification to assure the user that context is safe
-    st.toast("Screen cleared! AI context retained.", icon="🧹")
+
+    if level in ("session", "full"):
+        # 2. Reset core AI components to enforce re-attachment on the next script run
+        st.session_state.llm = None
+        st.session_state.agent_memory = None
+
+        # Using .pop() guarantees the key is removed, forcing the app to re-attach the AI pipeline.
+        st.session_state.pop("agent_executor", None)
+
+    if level == "full":
+        # 3. Sever the cached Gemini and Google Calendar connections, the tools, and all memoized calendar reads.
+        # Fresh LLM/tool objects also key a fresh Agent Executor on the next run.
+        get_llm.clear()
+        _get_google_credentials.clear()
+        _get_year_holidays.clear()
+        _get_calendar_service.clear()
+        get_calendar_tools.clear()
+        clear_schedule_cache()
+
+    # 4. Provide visual feedback of the completed reset
+    message, icon = _RESET_TOASTS[level]
+    st.toast(message, icon=icon)
 
 # ==========================================
 # VISUAL CALENDAR DATA FETCHER (FRONTEND)
@@ -124,39 +277,52 @@ def get_schedules():
     required by the frontend library.
     """
     try:
-        # 1. Authenticate using the stored OAuth token with full read/write scope
-        creds = Credentials.from_authorized_user_file('token.json', ['https://www.googleapis.com/auth/calendar'])
-        service = build('calendar', 'v3', credentials=creds)
-
-        # 2. Query the Google Calendar API
-        # Fetches up to 2500 events from the primary calendar, ensuring recurring events 
-        # are expanded into single instances (singleEvents=True).
-        result = service.events().list(
-            calendarId="primary",
-            maxResults=2500,
-            singleEvents=True,
-            orderBy='startTime',
-            timeZone='Asia/Jakarta'
-        ).execute()
-
-        # 3. Extract the array of event items from the API payload
-        raw_events_results = result.get("items", [])
-
-        # 4. Process and format the raw data for the GUI component
-        events_for_ui = []
-        for event in raw_events_results:
-            # Safely extract start and end times, falling back to 'date' for all-day events
-            start = event['start'].get('dateTime', event['start'].get('date'))
-            end = event['end'].get('dateTime', event['end'].get('date'))
-            
-            # Construct the event dictionary conforming to the FullCalendar.js standard
-            events_for_ui.append({
+        # 1. Reuse the cached, already-authenticated Google Calendar client
+        service = _get_calendar_service()
+
+        # 2. Define a bounded time window around today (RFC3339 timestamps)
+        now = datetime.now(timezone.utc)
+        time_min = (now - timedelta(days=_VISUAL_WINDOW_DAYS)).isoformat()
+        time_max = (now + timedelta(days=_VISUAL_WINDOW_DAYS)).isoformat()
+
+        # 3. Query the Google Calendar API page by page
+        # Recurring events are expanded into single instances (singleEvents=True), and the
+        # 'fields' mask strips attendees, reminders, etc. so only the used fields are transferred.
+        raw_events_results = []
+        page_token = None
+        while True:
+            result = service.events().list(
+                calendarId="primary",
+                timeMin=time_min,
+                timeMax=time_max,
+                maxResults=250,
+                singleEvents=True,
+                orderBy='startTime',
+                timeZone=_TIMEZONE,
+                fields=_EVENT_FIELDS,
+                pageToken=page_token
+            ).execute(num_retries=_NUM_RETRIES)
+
+            # Extract the array of event items from the API payload
+            raw_events_results.extend(result.get("items", []))
+
+            # Stop once the API reports no further pages
+            page_token = result.get("nextPageToken")
+            if not page_token:
+                break
+
+        # 4. Process and format the raw data for the GUI component in a single pass
+        # Each entry conforms to the FullCalendar.js standard; start/end fall back to 'date' for all-day events.
+        events_for_ui = [
+            {
                 "title": event.get('summary', 'Untitled Event'), # Translated fallback title
-                "start": start,
-                "end": end,
-                "backgroundColor": "#FF4B4B", # Streamlit's primary brand red color
-                "borderColor": "#FF4B4B"
-            })
+                "start": (start := event['start']).get('dateTime') or start.get('date'),
+                "end": (end := event['end']).get('dateTime') or end.get('date'),
+                "backgroundColor": _EVENT_COLOR,
+                "borderColor": _EVENT_COLOR
+            }
+            for event in raw_events_results
+        ]
             
         return events_for_ui
 
@@ -165,9 +331,112 @@ def get_schedules():
         return f"Failed to fetch visual calendar events: {e}"
         
 
+# ==========================================
+# EVENT FORMATTING & VALIDATION HELPERS
+# ==========================================
+def _format_event_time(start_raw: str, end_raw: str) -> tuple[str, str]:
+    """
+    Splits raw Google Calendar start/end strings into a ('YYYY-MM-DD', time label) pair.
+    Timed events arrive as 'YYYY-MM-DDTHH:MM:SS...' and yield 'HH:MM - HH:MM';
+    all-day events arrive as a bare 'YYYY-MM-DD' (exactly 10 characters) and yield 'All-day'.
+    """
+    if len(start_raw) > 10:
+        return start_raw[:10], f"{start_raw[11:16]} - {end_raw[11:16]}"
+    return start_raw[:10], "All-day"
+
+def _parse_date_range(start_date: str, end_date: str) -> tuple[date, date]:
+    """
+    Validates the 'YYYY-MM-DD' date range supplied by the agent before any API call is made.
+    Raises ValueError with an agent-readable explanation when a date is malformed or the range is reversed.
+    """
+    try:
+        start = datetime.strptime(start_date, "%Y-%m-%d").date()
+        end = datetime.strptime(end_date, "%Y-%m-%d").date()
+    except ValueError:
+        raise ValueError(
+            f"Invalid date input: start_date='{start_date}', end_date='{end_date}'. "
+            "Both dates MUST be in 'YYYY-MM-DD' format."
+        ) from None
+
+    if end < start:
+        raise ValueError(f"Invalid date range: end_date '{end_date}' is before start_date '{start_date}'.")
+
+    return start, end
+
+def _day_bounds(start: date, end: date) -> tuple[str, str]:
+    """
+    Converts an inclusive date range into RFC3339 'timeMin'/'timeMax' strings anchored to the calendar's timezone.
+    'timeMax' is the midnight after 'end', because the Calendar API treats it as an exclusive bound;
+    for the last representable date (e.g., '9999-12-31', often used for "all upcoming events") it is clamped to 23:59:59.
+    """
+    time_min = datetime.combine(start, time.min, tzinfo=CALENDAR_TZINFO)
+    if end == date.max:
+        time_max = datetime.combine(end, time(23, 59, 59), tzinfo=CALENDAR_TZINFO)
+    else:
+        time_max = datetime.combine(end + timedelta(days=1), time.min, tzinfo=CALENDAR_TZINFO)
+    return time_min.isoformat(), time_max.isoformat()
+
 # ==========================================
 # AI TOOL: EVENT ID SEARCHER (THE SNIPER)
 # ==========================================
+def _normalize_keyword(keyword: str) -> str:
+    """
+    Canonical cache key for a search keyword.
+    Google Calendar's free-text search ignores letter case and extra whitespace, so variants such as
+    'Dentist', 'dentist ' and 'DENTIST' return the same events and can share one cached response.
+    Uses 'lower()' rather than 'casefold()', which would rewrite the query itself (e.g., 'Straße' -> 'strasse').
+    """
+    return " ".join(keyword.lower().split())
+
+@st.cache_data(ttl=60, show_spinner=False)
+def _search_events_text(keyword: str) -> str:
+    """
+    Cached backend of 'get_id_of_schedules': searches the primary calendar for 'keyword' and formats the matches,
+    one line per event (an empty string when nothing matches). The header quoting the agent's own keyword is
+    added by the tool, since the cache key is the normalized form.
+    Results are memoized for 60 seconds and invalidated whenever a calendar-mutating tool runs.
+    """
+    # 1. Reuse the cached, already-authenticated Google Calendar client
+    service = _get_calendar_service()
+
+    # 2. Execute a free-text search query ('q') against the primary calendar
+    result = service.events().list(
+        calendarId="primary",
+        q=keyword,          # The search keyword provided by the AI
+        maxResults=10,      # Limit the results to prevent token overflow
+        singleEvents=True,  # Expand recurring events into single instances
+        timeZone=_TIMEZONE,
+        fields=_EVENT_FIELDS  # Partial response: only id/summary/start/end cross the wire
+    ).execute(num_retries=_NUM_RETRIES)
+
+    # 3. Extract the array of events from the API payload and order them chronologically
+    # Sorting the (at most 10) matches locally is cheaper than asking Google to sort server-side
+    events = sorted(
+        result.get("items", []),
+        key=lambda e: e['start'].get('dateTime') or e['start'].get('date')
+    )
+
+    # 4. Format one line per event so the LLM can easily read the Date, Title, Time, and ID
+    # Parts are collected in a list and joined once, avoiding quadratic string re-allocation
+    parts = []
+
+    for e in events:
+        title = e.get('summary', 'Untitled Event')
+        event_id = e.get('id', 'NO_ID_FOUND')
+
+        # Extract raw date/time strings from the API payload (nested dicts bound once per event)
+        start, end = e['start'], e['end']
+        start_raw = start.get('dateTime') or start.get('date')
+        end_raw = end.get('dateTime') or end.get('date')
+
+        # Split into the 'YYYY-MM-DD' date and the 'HH:MM - HH:MM' (or 'All-day') label
+        event_date, time_str = _format_event_time(start_raw, end_raw)
+
+        # Append the fully formatted event entry (Date, Title, Time, and ID in one single line)
+        parts.append(f"- [{event_date}] '{title}' ({time_str}) | EVENT_ID: {event_id}\n")
+
+    return "".join(parts)
+
 @tool
 def get_id_of_schedules(keyword: str) -> str:
     """
@@ -176,128 +445,294 @@ def get_id_of_schedules(keyword: str) -> str:
     It searches the primary calendar and returns a list of matching events with their dates, times, and unique IDs.
     """
     try:
-        # 1. Authenticate with the Google Calendar API using the predefined scopes
-        creds = Credentials.from_authorized_user_file('token.json', ['https://www.googleapis.com/auth/calendar'])
-        service = build('calendar', 'v3', credentials=creds)
+        # Served from a short-lived cache keyed on the normalized keyword; repeated or re-cased
+        # lookups within an agent turn skip the Google round-trip
+        matches = _search_events_text(_normalize_keyword(keyword))
+    except HttpError as e:
+        # Return a graceful error message back to the AI agent if the API call fails
+        return f"Error executing search tool: {str(e)}"
 
-        # 2. Execute a free-text search query ('q') against the primary calendar
+    # Handle the edge case where no events match the search query
+    if not matches:
+        return f"No events found matching the keyword: '{keyword}'."
+
+    return f"Matching Events Found for '{keyword}':\n{matches}"
+
+# ==========================================
+# AI TOOL: DATE RANGE SCHEDULE FETCHER
+# ==========================================
+def _list_calendar_events(calendar_id: str, time_min: str, time_max: str) -> tuple[list, bool]:
+    """
+    Lists a calendar's events between two RFC3339 bounds, following 'nextPageToken' until the calendar
+    is exhausted or '_MAX_TOOL_EVENTS' events are collected.
+    Returns the collected events and whether more events were left unread.
+    """
+    service = _get_calendar_service()
+    items = []
+    page_token = None
+    while True:
         result = service.events().list(
-            calendarId="primary",
-            q=keyword,          # The search keyword provided by the AI
-            maxResults=10,      # Limit the results to prevent token overflow
+            calendarId=calendar_id,
+            timeMin=time_min,
+            timeMax=time_max,
+            maxResults=_MAX_TOOL_EVENTS - len(items),
             singleEvents=True,  # Expand recurring events into single instances
             orderBy='startTime',
-            timeZone='Asia/Jakarta'
-        ).execute()
+            timeZone=_TIMEZONE,
+            fields=_EVENT_FIELDS,  # Partial response: only id/summary/start/end cross the wire
+            pageToken=page_token
+        ).execute(num_retries=_NUM_RETRIES)
+
+        items.extend(result.get("items", []))
+        page_token = result.get("nextPageToken")
+        if not page_token or len(items) >= _MAX_TOOL_EVENTS:
+            return items, bool(page_token)
+
+@st.cache_data(ttl=86400, show_spinner=False)
+def _get_year_holidays(year: int) -> list:
+    """
+    Returns every Indonesian public holiday of the given year, fetched once and kept for 24 hours.
+    The holiday calendar is small and changes rarely, so date-range lookups filter this list locally
+    instead of querying the holiday calendar on every call.
+    """
+    items, _ = _list_calendar_events(_HOLIDAY_CALENDAR_ID, *_day_bounds(date(year, 1, 1), date(year, 12, 31)))
+    return items
 
-        # 3. Extract the array of events from the API payload
-        events = result.get("items", [])
-        
-        # 4. Handle the edge case where no events match the search query
-        if not events:
-            return f"No events found matching the keyword: '{keyword}'."
+def _event_boundary(boundary: dict) -> datetime:
+    """
+    Converts an event's 'start' or 'end' payload into an aware datetime in the calendar's timezone.
+    All-day events carry a bare 'date', which is anchored to local midnight (the API's exclusive all-day end).
+    """
+    if "dateTime" in boundary:
+        return datetime.fromisoformat(boundary["dateTime"])
+    return datetime.combine(date.fromisoformat(boundary["date"]), time.min, tzinfo=CALENDAR_TZINFO)
 
-        # 5. Format the output string so the LLM can easily read the Date, Title, Time, and ID
-        response = f"Matching Events Found for '{keyword}':\n"
-        
-        for e in events:
-            title = e.get('summary', 'Untitled Event')
-            event_id = e.get('id', 'NO_ID_FOUND')
-            
-            # Extract raw date/time strings from the API payload
-            start_raw = e['start'].get('dateTime', e['start'].get('date'))
-            end_raw = e['end'].get('dateTime', e['end'].get('date'))
-
-            # Extract just the 'YYYY-MM-DD' portion for AI context
-            event_date = start_raw[:10]
-
-            # Determine if the event is time-bound or an all-day occurrence
-            if "T" in start_raw:
-                start_time = start_raw[11:16] # Extract HH:MM
-                end_time = end_raw[11:16]
-                time_str = f"{start_time} - {end_time}"
-            else:
-                time_str = "All-day"
-
-            # Append the fully formatted event entry (Date, Title, Time, and ID in one single line)
-            response += f"- [{event_date}] '{title}' ({time_str}) | EVENT_ID: {event_id}\n"
-            
-        return response
+def _holidays_between(start: date, end: date) -> list:
+    """
+    Selects the cached holidays that overlap the inclusive range, in chronological order.
+    Matches the API's own 'timeMin'/'timeMax' semantics, so multi-day holidays that began
+    before 'start' are still included.
+    Ranges spanning more than '_HOLIDAY_CACHE_MAX_YEARS' calendar years are served by a single
+    live query instead, so a wide range never fans out into one sequential request per year.
+    """
+    time_min, time_max = _day_bounds(start, end)
+    if end.year - start.year + 1 > _HOLIDAY_CACHE_MAX_YEARS:
+        holidays, _ = _list_calendar_events(_HOLIDAY_CALENDAR_ID, time_min, time_max)
+        return holidays
+
+    range_start, range_end = datetime.fromisoformat(time_min), datetime.fromisoformat(time_max)
+    return [
+        e
+        # The previous year is scanned too, for holidays spanning New Year ('date' has no year 0)
+        for year in range(max(start.year - 1, date.min.year), end.year + 1)
+        for e in _get_year_holidays(year)
+        if _event_boundary(e['start']) < range_end and _event_boundary(e['end']) > range_start
+    ]
+
+@st.cache_data(ttl=60, show_spinner=False)
+def _fetch_schedule_text(start_date: date, end_date: date) -> str:
+    """
+    Cached backend of 'get_all_schedules': aggregates the primary calendar and the cached holidays for the date range.
+    Results are memoized for 60 seconds and invalidated whenever a calendar-mutating tool runs.
+    """
+    # 1. Compute the local-midnight time boundaries in the calendar's timezone (timeMax is exclusive)
+    timeMin, timeMax = _day_bounds(start_date, end_date)
 
-    except Exception as e:
-        # 6. Return a graceful error message back to the AI agent if the API call fails
-        return f"Error executing search tool: {str(e)}"
+    # 2. Query the primary calendar live (over a pooled keep-alive transport); holidays normally come from
+    # an in-memory cache, so a second thread to overlap them with this request would buy nothing
+    # A primary-calendar HttpError propagates to the caller, so an outage is never memoized as an empty schedule
+    all_events, truncated = _list_calendar_events('primary', timeMin, timeMax)
+
+    # 3. Append the matching holidays from the daily cache, preserving the calendar order
+    try:
+        all_events.extend(_holidays_between(start_date, end_date))
+    except HttpError:
+        # Holidays are supplementary: skip them if the holiday calendar is inaccessible or keeps failing
+        pass
+
+    # 4. Handle the edge case where no events are found in the given timeframe
+    if not all_events:
+        return f"No events scheduled from {start_date} to {end_date}."
+
+    # 5. Format the aggregated events into a clean, readable string for both UI and AI context
+    # Parts are collected in a list and joined once, avoiding quadratic string re-allocation
+    parts = [f"Schedule from {start_date} to {end_date}:\n"]
+
+    for e in all_events:
+        title = e.get('summary', 'Untitled Event')
+
+        # Extract raw date/time strings from the API payload (nested dicts bound once per event)
+        start, end = e['start'], e['end']
+        start_raw = start.get('dateTime') or start.get('date')
+        end_raw = end.get('dateTime') or end.get('date')
+
+        # Split into the 'YYYY-MM-DD' date and the 'HH:MM - HH:MM' (or 'All-day') label
+        event_date, time_str = _format_event_time(start_raw, end_raw)
+
+        # Append the formatted event entry (Notice: NO EVENT_ID here to keep UI clean)
+        parts.append(f"- [{event_date}] {title} ({time_str})\n")
+
+    # 6. Tell the agent when the listing is incomplete, so it can narrow the range instead of re-querying
+    if truncated:
+        parts.append(
+            f"(Note: only the first {_MAX_TOOL_EVENTS} events of the primary calendar are listed; "
+            "request a narrower date range to see the rest.)\n"
+        )
+
+    return "".join(parts)
+
+def _get_all_schedules(start_date: str, end_date: str) -> str:
+    """
+    USE THIS TOOL TO RETRIEVE ALL SCHEDULED EVENTS AND HOLIDAYS WITHIN A SPECIFIC DATE RANGE.
+    The 'start_date' and 'end_date' inputs MUST be strictly in 'YYYY-MM-DD' format.
+    If the user asks for a single day's schedule (e.g., "today"), provide the exact same date for both inputs.
+    """
+    # Fail fast on malformed dates (e.g., 'tomorrow') instead of wasting a full API round-trip
+    try:
+        start, end = _parse_date_range(start_date, end_date)
+    except ValueError as e:
+        return str(e)
+
+    try:
+        # Served from a short-lived cache keyed on the canonical dates; repeated lookups within
+        # an agent turn skip the Google round-trip
+        return _fetch_schedule_text(start, end)
+    except HttpError as e:
+        # Gracefully return the API error back to the AI agent
+        return f"Error executing schedule fetcher: {str(e)}"
+
+async def get_all_schedules_async(start_date: str, end_date: str) -> str:
+    """
+    Async variant of 'get_all_schedules', used when the agent runs on an event loop (e.g., 'ainvoke').
+    The blocking Google API calls are off-loaded to a worker thread, so the loop stays free to stream
+    LLM tokens or run other tools; validation, error handling and caching all come from '_get_all_schedules'.
+    """
+    return await asyncio.to_thread(_get_all_schedules, start_date, end_date)
+
+# Assembled from the sync/async pair, so async agent runs await the coroutine instead of blocking on the sync function.
+# The tool's name, description and argument schema are derived from '_get_all_schedules' as '@tool' would.
+get_all_schedules = StructuredTool.from_function(
+    func=_get_all_schedules,
+    coroutine=get_all_schedules_async,
+    name="get_all_schedules"
+)
 
 # ==========================================
-# AI TOOL: DATE RANGE SCHEDULE FETCHER
+# AI TOOL: AVAILABILITY CHECKER (FREE/BUSY)
 # ==========================================
+@st.cache_data(ttl=60, show_spinner=False)
+def _fetch_busy_text(start_date: date, end_date: date) -> str:
+    """
+    Cached backend of 'get_busy_slots': asks the free/busy endpoint for the busy intervals of the primary calendar.
+    A single request returns bare time ranges only, without titles or other event details.
+    Public holidays are published as transparent (non-blocking) events, so the holiday calendar is not queried.
+    Raises 'LookupError' when Google reports the calendar as unreadable, so the failure is never cached as "free".
+    """
+    # 1. Reuse the cached, already-authenticated Google Calendar client
+    service = _get_calendar_service()
+
+    # 2. Compute the local-midnight time boundaries in the calendar's timezone (timeMax is exclusive)
+    timeMin, timeMax = _day_bounds(start_date, end_date)
+
+    # 3. Query the primary calendar; busy intervals come back in the requested timezone
+    result = service.freebusy().query(body={
+        "timeMin": timeMin,
+        "timeMax": timeMax,
+        "timeZone": _TIMEZONE,
+        "items": [{"id": "primary"}]
+    }).execute(num_retries=_NUM_RETRIES)
+
+    # 4. Per-calendar failures (notFound, permission, range too wide) are reported in-band, not as HTTP errors
+    calendar = result.get("calendars", {}).get("primary", {})
+    if calendar.get("errors"):
+        reasons = ", ".join(err.get("reason", "unknown") for err in calendar["errors"])
+        raise LookupError(f"Google could not read the free/busy data of the 'primary' calendar ({reasons}).")
+
+    busy = calendar.get("busy", [])
+
+    # 5. Handle the edge case where the whole range is free
+    if not busy:
+        return f"No busy time slots from {start_date} to {end_date}. The user is completely free."
+
+    # 6. List the intervals chronologically (RFC3339 strings in the same offset sort correctly)
+    parts = [f"Busy time slots from {start_date} to {end_date}:\n"]
+    for slot in sorted(busy, key=lambda s: s["start"]):
+        parts.append(f"- {slot['start']} -> {slot['end']}\n")
+
+    return "".join(parts)
+
 @tool
-def get_all_schedules(start_date: str, end_date: str) -> str:
+def get_busy_slots(start_date: str, end_date: str) -> str:
     """
-    USE THIS TOOL TO RETRIEVE ALL SCHEDULED EVENTS AND HOLIDAYS WITHIN A SPECIFIC DATE RANGE.
+    USE THIS TOOL TO CHECK WHETHER THE USER IS FREE OR BUSY WITHIN A SPECIFIC DATE RANGE (e.g., "Am I free on Friday afternoon?").
     The 'start_date' and 'end_date' inputs MUST be strictly in 'YYYY-MM-DD' format.
-    If the user asks for a single day's schedule (e.g., "today"), provide the exact same date for both inputs.
+    It returns only the busy time intervals (no titles or IDs) and does NOT cover public holidays;
+    use 'get_all_schedules' when the user wants to see the events themselves or asks about holidays.
     """
+    # Fail fast on malformed dates (e.g., 'tomorrow') instead of wasting a full API round-trip
     try:
-        # 1. Authenticate with the Google Calendar API using the predefined scopes.
-        creds = Credentials.from_authorized_user_file('token.json', ['https://www.googleapis.com/auth/calendar'])
-        service = build('calendar', 'v3', credentials=creds)
-
-        # 2. Format the time boundaries (Appending +07:00 for WIB/Jakarta Timezone)
-        timeMin = f"{start_date}T00:00:00+07:00"
-        timeMax = f"{end_date}T23:59:59+07:00"
-
-        # 3. Define the list of target calendars (Primary user calendar & Indonesian Holidays)
-        target_calendars = ['primary', 'id.indonesian#holiday@group.v.calendar.google.com']
-        all_events = []
-
-        # 4. Iterate through each calendar and aggregate the matching events
-        for calendar_id in target_calendars:
-            try: 
-                result = service.events().list(
-                    calendarId=calendar_id,
-                    timeMin=timeMin,
-                    timeMax=timeMax,
-                    maxResults=50,      # Increased limit to accommodate multi-day ranges
-                    singleEvents=True,  # Expand recurring events into single instances
-                    orderBy='startTime',
-                    timeZone='Asia/Jakarta'
-                ).execute()
-                all_events.extend(result.get("items", []))
-            except:
-                # Silently skip if a specific calendar is inaccessible or fails
-                continue
-
-        # 5. Handle the edge case where no events are found in the given timeframe
-        if not all_events:
-            return f"No events scheduled from {start_date} to {end_date}."
-
-        # 6. Format the aggregated events into a clean, readable string for both UI and AI context
-        response = f"Schedule from {start_date} to {end_date}:\n"
-        
-        for e in all_events:
-            title = e.get('summary', 'Untitled Event')
-            
-            # Extract raw date/time strings from the API payload
-            start_raw = e['start'].get('dateTime', e['start'].get('date'))
-            end_raw = e['end'].get('dateTime', e['end'].get('date'))
-
-            # Extract just the 'YYYY-MM-DD' portion for clear visual grouping
-            event_date = start_raw[:10]
-
-            # Determine if the event is time-bound or an all-day occurrence
-            if "T" in start_raw:
-                start_time = start_raw[11:16] # Extract HH:MM
-                end_time = end_raw[11:16]
-                time_str = f"{start_time} - {end_time}"
-            else:
-                time_str = "All-day"
-
-            # Append the formatted event entry (Notice: NO EVENT_ID here to keep UI clean)
-            response += f"- [{event_date}] {title} ({time_str})\n"
-            
-        return response
+        start, end = _parse_date_range(start_date, end_date)
+    except ValueError as e:
+        return str(e)
 
-    except Exception as e:
-        # 7. Gracefully return the error back to the AI agent
-        return f"Error executing schedule fetcher: {str(e)}"
\ No newline at end of file
+    try:
+        return _fetch_busy_text(start, end)
+    except (HttpError, LookupError) as e:
+        # Gracefully return the API error back to the AI agent
+        return f"Error executing availability checker: {str(e)}"
+
+# ==========================================
+# AGENT TOOLBOX ASSEMBLY (CACHED)
+# ==========================================
+@st.cache_resource(show_spinner=False)
+def get_calendar_tools():
+    """
+    Initializes the Google Calendar Toolkit and assembles the final tool list for the agent.
+    Cached once per server process, so the toolkit's OAuth setup is not repeated on every rerun.
+    Banned native tools are removed via an O(1) set lookup, then the custom tools are injected.
+    """
+    # 1. Initialize the native Google Calendar Toolkit on top of the shared, in-memory authenticated client
+    calendar_tools = CalendarToolkit(api_resource=_get_calendar_service()).get_tools()
+
+    # 2. Filter out the banned native tools
+    used_tools = [t for t in calendar_tools if t.name.lower() not in _BANNED_TOOLS]
+
+    # 3. Inject our custom, highly-optimized tools
+    return used_tools + [get_id_of_schedules, get_all_schedules, get_busy_slots]
+
+# ==========================================
+# SIDEBAR AGENDA FETCHER (CACHED)
+# ==========================================
+@st.cache_data(ttl=60, show_spinner=False)
+def get_today_agenda(date_str: str) -> str:
+    """
+    Returns the formatted agenda for a single day to populate the sidebar widget.
+    The result is memoized per date for 60 seconds, so the many reruns triggered by ordinary
+    widget interactions reuse the same response instead of re-querying the Google Calendar API.
+    """
+    # Calls the cached fetcher directly (not the tool wrapper), so API failures raise to the caller
+    # instead of being memoized here as an error string
+    day = date.fromisoformat(date_str)
+    return _fetch_schedule_text(day, day)
+
+# ==========================================
+# SCHEDULE CACHE INVALIDATION
+# ==========================================
+def clear_schedule_cache():
+    """
+    Discards every memoized calendar read (tool lookups and the sidebar agenda),
+    so the next request reflects the calendar's latest state.
+    """
+    _search_events_text.clear()
+    _fetch_schedule_text.clear()
+    _fetch_busy_text.clear()
+    get_today_agenda.clear()
+
+def on_tool_executed(tool_name: str):
+    """
+    Hook invoked after each agent tool step.
+    Any tool outside the read-only set may have created, updated, moved, or deleted an event,
+    so cached reads are invalidated before the agent can observe stale data.
+    """
+    if tool_name not in _READ_ONLY_TOOLS:
+        clear_schedule_cache()